@@ -1,4 +1,3 @@
-
 """
 Single-file RL client combining API operations, Q-learning agent, and an automatic game runner.
 Uses two endpoints:
@@ -10,216 +9,45 @@ cURL example to fetch last run:
   curl -s -X POST "${INDEX_ENDPOINT}" \
     -H "X-User-ID: ${USER_ID}" \
     -H "X-API-Key: ${API_KEY}" \
-    -H "Content-Type: application/json" \
-    -d '{"type":"runs","teamId":"${TEAM_ID}","count":1}' | jq .
+    -d "type=runs&teamId=${TEAM_ID}&count=1" | jq .
 """
 import os
 import sys
 import json
-import random
+import asyncio
+import atexit
 
-# Ensure 'requests' is installed
+# Ensure 'httpx' (with HTTP/2 support) is installed
 try:
-    import requests
+    import httpx
+    import h2  # noqa: F401  (required by httpx for http2=True)
 except ImportError:
-    print("Error: 'requests' library not installed. Run 'pip install requests'", file=sys.stderr)
+    print("Error: 'httpx[http2]' library not installed. Run 'pip install \"httpx[http2]\"'", file=sys.stderr)
     sys.exit(1)
 
-# ——— Configuration —————————————————————————————————————————————————————
-GW_ENDPOINT    = os.getenv(
-    "GW_ENDPOINT",
-    "https://www.notexponential.com/aip2pgaming/api/rl/gw.php"
-)
-INDEX_ENDPOINT = os.getenv(
-    "INDEX_ENDPOINT",
-    "https://www.notexponential.com/aip2pgaming/api/index.php"
-)
-TEAM_ID        = os.getenv("TEAM_ID", "1449")
-USER_ID        = os.getenv("USER_ID", "3669")
-API_KEY        = os.getenv("API_KEY", "60dea00b9a42f4329cdf")
-DATA_FILE      = "points.json"
-
-# ——— API Client —————————————————————————————————————————————————————
-class APIClient:
-    def __init__(self):
-        self.gw_url = GW_ENDPOINT.rstrip("/")
-        self.index_url = INDEX_ENDPOINT.rstrip("/")
-        self.headers = {
-            "X-User-ID": USER_ID,
-            "X-API-Key": API_KEY,
-            "Content-Type": "application/json"
-        }
-        self.team_id = TEAM_ID
-        self.data_file = DATA_FILE
-        self._ensure_data_file()
-
-    def _ensure_data_file(self):
-        if not os.path.exists(self.data_file):
-            with open(self.data_file, "w") as f:
-                json.dump({}, f)
-
-    def _load_data(self):
-        with open(self.data_file, "r") as f:
-            return json.load(f)
-
-    def _save_data(self, data):
-        with open(self.data_file, "w") as f:
-            json.dump(data, f, indent=2)
-
-    # Index.php operations (use POST)
-    def get_runs(self, count=1):
-        payload = {"type": "runs", "teamId": self.team_id, "count": count}
-        resp = requests.post(self.index_url, headers=self.headers, json=payload)
-        resp.raise_for_status()
-        return resp.json()
-
-    def get_score(self):
-        payload = {"type": "score", "teamId": self.team_id}
-        resp = requests.post(self.index_url, headers=self.headers, json=payload)
-        resp.raise_for_status()
-        return resp.json()
-
-    # GW.php operations
-    def get_location(self):
-        params = {"type": "location", "teamId": self.team_id}
-        resp = requests.get(self.gw_url, headers=self.headers, params=params)
-        resp.raise_for_status()
-        return resp.json()
-
-    def enter_world(self, world_id):
-        payload = {"type": "enter", "teamId": self.team_id, "worldId": world_id}
-        resp = requests.post(self.gw_url, headers=self.headers, json=payload)
-        resp.raise_for_status()
-        return resp.json()
-
-    def make_move(self, world_id, move):
-        payload = {"type": "move", "teamId": self.team_id,
-                   "worldId": world_id, "move": move}
-        resp = requests.post(self.gw_url, headers=self.headers, json=payload)
-        resp.raise_for_status()
-        return resp.json()
-
-    # Combined status fetch
-    def get_all_status(self, world_id: str):
-        # 1. Last run
-        runs_resp = self.get_runs(1)
-        last_run = None
-        if runs_resp.get("code") == "OK":
-            runs_list = runs_resp.get("runs", [])
-            last_run = runs_list[-1] if runs_list else None
-        # 2. Current location
-        loc = self.get_location()
-        # 3. Enter world if not in one
-        if loc.get("worldId") == "-1":
-            enter = self.enter_world(world_id)
-        else:
-            enter = {"currentRun": loc.get("runId")}
-        return {"last_run": last_run, "location": loc, "enter": enter}
-
-    # Local point persistence
-    def store_points(self, world_id, points):
-        data = self._load_data()
-        team = data.setdefault(self.team_id, {"total": 0, "by_world": {}})
-        team["by_world"][world_id] = points
-        team["total"] = sum(team["by_world"].values())
-        self._save_data(data)
-
-    def load_points(self):
-        data = self._load_data()
-        return data.get(self.team_id, {"total": 0, "by_world": {}})
-
-# ——— Q-Learning Agent —————————————————————————————————————————————————
-class QLearningAgent:
-    def __init__(
-        self, client: APIClient, world_id: str,
-        directions=None, alpha=0.1, gamma=0.9,
-        epsilon=1.0, episodes=100,
-        min_epsilon=0.01, decay_rate=0.995
-    ):
-        self.client = client
-        self.world_id = world_id
-        self.directions = directions or ["N", "S", "W", "E"]
-        self.alpha = alpha
-        self.gamma = gamma
-        self.epsilon = epsilon
-        self.episodes = episodes
-        self.min_epsilon = min_epsilon
-        self.decay_rate = decay_rate
-        self.Q = {}
-
-    def _state_key(self, state):
-        return tuple(state) if isinstance(state, (list, tuple)) else (state,)
-
-    def choose_direction(self, state_key, valid_dirs=None):
-        dirs = valid_dirs or self.directions
-        if random.random() < self.epsilon:
-            return random.choice(dirs)
-        q_vals = [self.Q.get((state_key, d), 0) for d in dirs]
-        max_q = max(q_vals)
-        best = [d for d, q in zip(dirs, q_vals) if q == max_q]
-        return random.choice(best)
-
-    def valid_directions(self, position, grid_size=40):
-        x, y = position
-        m = grid_size - 1
-        dirs = []
-        if x > 0: dirs.append("N")
-        if x < m: dirs.append("S")
-        if y > 0: dirs.append("W")
-        if y < m: dirs.append("E")
-        return dirs or self.directions
-
-    def learn(self, state_key, action, reward, next_key, done):
-        q_val = self.Q.get((state_key, action), 0)
-        if done:
-            target = reward
-        else:
-            future_max = max(self.Q.get((next_key, d), 0) for d in self.directions)
-            target = reward + self.gamma * future_max
-        self.Q[(state_key, action)] = q_val + self.alpha * (target - q_val)
-
-    def train(self):
-        best_reward = float('-inf')
-        for _ in range(self.episodes):
-            self.client.enter_world(self.world_id)
-            loc = self.client.get_location()
-            position = loc.get("position", [])
-            state_key = self._state_key((loc.get("worldId"), tuple(position)))
-            done = False
-            total = 0
-            while not done:
-                valid = self.valid_directions(position)
-                move = self.choose_direction(state_key, valid)
-                res = self.client.make_move(self.world_id, move)
-                reward = res.get("reward", 0)
-                done = res.get("completed", False)
-                position = res.get("position", [])
-                next_key = self._state_key((res.get("worldId"), tuple(position)))
-                self.learn(state_key, move, reward, next_key, done)
-                state_key = next_key
-                total += reward
-            best_reward = max(best_reward, total)
-            self.epsilon = max(self.min_epsilon, self.epsilon * self.decay_rate)
-        self.client.store_points(self.world_id, best_reward)
-        return best_reward
-
-# ——— Main —————————————————————————————————————————————————————————
-def main():
-    client = APIClient()
-
-    status = client.get_all_status(input("Enter world ID: ").strip())
-    print(json.dumps(status, indent=2))import os
-import sys
-import json
-import random
+# Ensure 'orjson' is installed
+try:
+    import orjson
+except ImportError:
+    print("Error: 'orjson' library not installed. Run 'pip install orjson'", file=sys.stderr)
+    sys.exit(1)
 
-# Ensure 'requests' is installed
+# Ensure 'numpy' is installed
 try:
-    import requests
+    import numpy as np
 except ImportError:
-    print("Error: 'requests' library not installed. Run 'pip install requests'", file=sys.stderr)
+    print("Error: 'numpy' library not installed. Run 'pip install numpy'", file=sys.stderr)
     sys.exit(1)
 
+# 'numba' is optional: without it the kernels below run as plain Python
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
 # ——— Configuration ———————————————————————————————
 GW_ENDPOINT = os.getenv("GW_ENDPOINT", "https://www.notexponential.com/aip2pgaming/api/rl/gw.php")
 INDEX_ENDPOINT = os.getenv("INDEX_ENDPOINT", "https://www.notexponential.com/aip2pgaming/api/index.php")
@@ -227,6 +55,11 @@ TEAM_ID = os.getenv("TEAM_ID", "1449")
 USER_ID = os.getenv("USER_ID", "3669")
 API_KEY = os.getenv("API_KEY", "60dea00b9a42f4329cdf")
 DATA_FILE = "points.json"
+DEBUG = os.getenv("DEBUG", "0") == "1"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Moves are not idempotent: a 500/502/504 may arrive after gw.php applied the move
+MOVE_RETRY_STATUSES = {429, 503}
+MAX_RETRY_AFTER = 30
 
 # ——— API Client ——————————————————————————————————————
 class APIClient:
@@ -237,90 +70,162 @@ class APIClient:
             "X-User-ID": USER_ID,
             "X-API-Key": API_KEY
         }
+        # One HTTP/2 client for every call, so concurrent requests multiplex over one connection
+        # (the transport also retries failed connection attempts)
+        self.session = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=8, max_connections=16),
+                retries=3
+            ),
+            headers=self.base_headers,
+            timeout=10.0
+        )
+        # 429/5xx responses are retried on the same warm connection with exponential backoff
+        self.max_retries = 5
+        self.backoff_factor = 0.3
         self.team_id = TEAM_ID
         self.data_file = DATA_FILE
         self._ensure_data_file()
+        # Points live in memory; main() flushes them, with atexit as a fallback
+        self._points = self._load_data()
+        self._dirty = False
+        atexit.register(self.flush)
 
     def _ensure_data_file(self):
         if not os.path.exists(self.data_file):
-            with open(self.data_file, "w") as f:
-                json.dump({}, f)
+            with open(self.data_file, "wb") as f:
+                f.write(orjson.dumps({}))
 
     def _load_data(self):
-        with open(self.data_file, "r") as f:
-            return json.load(f)
+        with open(self.data_file, "rb") as f:
+            return orjson.loads(f.read())
 
     def _save_data(self, data):
-        with open(self.data_file, "w") as f:
-            json.dump(data, f, indent=2)
+        # Serialize before touching the file and swap it in atomically, so a failure keeps the old points
+        payload = orjson.dumps(data, option=orjson.OPT_INDENT_2 if DEBUG else 0)
+        tmp_file = self.data_file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_file, self.data_file)
+
+    def flush(self):
+        if self._dirty:
+            self._save_data(self._points)
+            self._dirty = False
+
+    async def _request(self, method, url, retry_statuses=RETRY_STATUSES, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            resp = await self.session.request(method, url, **kwargs)
+            if resp.status_code in retry_statuses and attempt < self.max_retries:
+                retry_after = resp.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = min(int(retry_after), MAX_RETRY_AFTER)
+                else:
+                    delay = self.backoff_factor * (2 ** attempt)
+                await asyncio.sleep(delay)
+                continue
+            resp.raise_for_status()
+            return orjson.loads(resp.content)
+
+    async def close(self):
+        await self.session.aclose()
 
     # — Index.php operations (form-encoded) —
-    def get_runs(self, count=1):
+    async def get_runs(self, count=1):
         payload = {"type": "runs", "teamId": self.team_id, "count": count}
-        resp = requests.post(self.index_url, headers=self.base_headers, data=payload)
-        resp.raise_for_status()
-        return resp.json()
+        return await self._request("POST", self.index_url, data=payload)
 
-    def get_score(self):
+    async def get_score(self):
         payload = {"type": "score", "teamId": self.team_id}
-        resp = requests.post(self.index_url, headers=self.base_headers, data=payload)
-        resp.raise_for_status()
-        return resp.json()
+        return await self._request("POST", self.index_url, data=payload)
 
     # — GW.php operations (JSON-based) —
-    def get_location(self):
+    async def get_location(self):
         params = {"type": "location", "teamId": self.team_id}
-        resp = requests.get(self.gw_url, headers=self.base_headers, params=params)
-        resp.raise_for_status()
-        return resp.json()
+        return await self._request("GET", self.gw_url, params=params)
 
-    def enter_world(self, world_id):
+    async def enter_world(self, world_id):
         payload = {"type": "enter", "teamId": self.team_id, "worldId": world_id}
-        headers = {**self.base_headers, "Content-Type": "application/json"}
-        resp = requests.post(self.gw_url, headers=headers, json=payload)
-        resp.raise_for_status()
-        return resp.json()
+        return await self._request("POST", self.gw_url, json=payload)
 
-    def make_move(self, world_id, move):
+    async def make_move(self, world_id, move):
         payload = {"type": "move", "teamId": self.team_id, "worldId": world_id, "move": move}
-        headers = {**self.base_headers, "Content-Type": "application/json"}
-        resp = requests.post(self.gw_url, headers=headers, json=payload)
-        resp.raise_for_status()
-        return resp.json()
+        return await self._request("POST", self.gw_url, retry_statuses=MOVE_RETRY_STATUSES, json=payload)
+
+    async def make_moves(self, world_id, moves):
+        # Needs a gw.php that accepts "move_batch"; per-move responses come back in "results"
+        payload = {"type": "move_batch", "teamId": self.team_id, "worldId": world_id, "moves": list(moves)}
+        return await self._request("POST", self.gw_url, retry_statuses=MOVE_RETRY_STATUSES, json=payload)
 
-    def get_all_status(self, world_id: str):
-        runs_resp = self.get_runs(1)
+    async def get_all_status(self, world_id: str):
+        runs_resp = await self.get_runs(1)
         last_run = None
         if runs_resp.get("code") == "OK":
             runs_list = runs_resp.get("runs", [])
             last_run = runs_list[-1] if runs_list else None
 
-        loc = self.get_location()
+        loc = await self.get_location()
 
         if loc.get("worldId") == "-1":
-            enter = self.enter_world(world_id)
+            enter = await self.enter_world(world_id)
         else:
             enter = {"currentRun": loc.get("runId")}
 
         return {"last_run": last_run, "location": loc, "enter": enter}
 
     def store_points(self, world_id, points):
-        data = self._load_data()
-        team = data.setdefault(self.team_id, {"total": 0, "by_world": {}})
+        # JSON object keys are strings, so key by str(world_id) to match what _load_data returns
+        world_id = str(world_id)
+        team = self._points.setdefault(self.team_id, {"total": 0, "by_world": {}})
+        team["total"] += points - team["by_world"].get(world_id, 0)
         team["by_world"][world_id] = points
-        team["total"] = sum(team["by_world"].values())
-        self._save_data(data)
+        self._dirty = True
 
     def load_points(self):
-        data = self._load_data()
-        return data.get(self.team_id, {"total": 0, "by_world": {}})
+        return self._points.get(self.team_id, {"total": 0, "by_world": {}})
+
+# ——— Q-Update Kernels ——————————————————————————————
+@njit(cache=True, boundscheck=True)
+def q_update(Q, x, y, a, reward, nx, ny, done, alpha, gamma):
+    fut = 0.0 if done else max(Q[nx, ny, 0], Q[nx, ny, 1], Q[nx, ny, 2], Q[nx, ny, 3])
+    Q[x, y, a] += alpha * (reward + gamma * fut - Q[x, y, a])
+
+
+@njit(cache=True, boundscheck=True)
+def argmax_valid(q4, mask, u):
+    # Greedy action over the directions set in the N/S/W/E bitmask; u in [0, 1) picks among ties
+    best = -np.inf
+    n_best = 0
+    for i in range(4):
+        if (mask >> i) & 1:
+            if q4[i] > best:
+                best = q4[i]
+                n_best = 1
+            elif q4[i] == best:
+                n_best += 1
+    pick = int(u * n_best)
+    for i in range(4):
+        if (mask >> i) & 1 and q4[i] == best:
+            if pick == 0:
+                return i
+            pick -= 1
+    return -1
 
 # ——— Q-Learning Agent ——————————————————————————————
 class QLearningAgent:
+    DIRS = ("N", "S", "W", "E")
+    DIR_IDX = {d: i for i, d in enumerate(DIRS)}
+    DIR_DELTA = {"N": (-1, 0), "S": (1, 0), "W": (0, -1), "E": (0, 1)}
+
     def __init__(self, client: APIClient, world_id: str,
                  directions=None, alpha=0.1, gamma=0.9,
                  epsilon=1.0, episodes=100,
-                 min_epsilon=0.01, decay_rate=0.995):
+                 min_epsilon=0.01, decay_rate=0.995, grid_size=40,
+                 workers=1, max_concurrent_episodes=1, batch_size=1, seed=None):
+        # _state_key packs y into the low 8 bits, so coordinates must stay below 256
+        if not 1 <= grid_size <= 256:
+            raise ValueError(f"grid_size must be between 1 and 256, got {grid_size}")
         self.client = client
         self.world_id = world_id
         self.directions = directions or ["N", "S", "W", "E"]
@@ -330,86 +235,176 @@ class QLearningAgent:
         self.episodes = episodes
         self.min_epsilon = min_epsilon
         self.decay_rate = decay_rate
-        self.Q = {}
-
-    def _state_key(self, state):
-        return tuple(state) if isinstance(state, (list, tuple)) else (state,)
+        self.grid_size = grid_size
+        self.rng = np.random.default_rng(seed)
+        # The server keeps a single run per team, so only raise these when it can
+        # host parallel runs; workers share self.Q (Q-learning is off-policy)
+        self.workers = workers
+        self.max_concurrent_episodes = max_concurrent_episodes
+        # Greedy moves sent per request; >1 requires server support for make_moves
+        self.batch_size = batch_size
+        # Dense Q-table indexed by (x, y, DIR_IDX[direction])
+        self.Q = np.zeros((grid_size, grid_size, 4), dtype=np.float32)
+        # Valid moves per cell as a bitmask (bit 0=N, 1=S, 2=W, 3=E), built once for the grid
+        self._all_mask = sum(1 << self.DIR_IDX[d] for d in self.directions)
+        x, y = np.ogrid[:grid_size, :grid_size]
+        m = grid_size - 1
+        self._valid_mask = ((x > 0) * 1 | (x < m) * 2 | (y > 0) * 4 | (y < m) * 8).astype(np.uint8)
+        self._valid_mask[self._valid_mask == 0] = self._all_mask
+        self._mask_dirs = [tuple(d for i, d in enumerate(self.DIRS) if (mask >> i) & 1)
+                           for mask in range(16)]
+
+    def _state_key(self, position):
+        # Encode (x, y) as one int, (x << 8) | y
+        if not position:
+            raise ValueError("cannot build a state key without a position")
+        x, y = position
+        self._check_cell(x, y)
+        return (x << 8) | y
+
+    def choose_moves(self, position, valid_mask=None):
+        # Epsilon-greedy: explore steps go out alone; greedy steps are planned batch_size ahead
+        mask = valid_mask or self._all_mask
+        if self.rng.random() < self.epsilon:
+            return [self.random_direction(mask)]
+        return self.plan_greedy(position, self.batch_size)
+
+    def _check_cell(self, x, y):
+        # Negative indices would wrap silently in numpy, so reject anything off the grid up front
+        if not (0 <= x < self.grid_size and 0 <= y < self.grid_size):
+            raise ValueError(f"cell ({x}, {y}) is outside the {self.grid_size}x{self.grid_size} grid")
+
+    def greedy_direction(self, position, valid_mask):
+        x, y = position
+        self._check_cell(x, y)
+        return self.DIRS[argmax_valid(self.Q[x, y], valid_mask, self.rng.random())]
 
-    def choose_direction(self, state_key, valid_dirs=None):
-        dirs = valid_dirs or self.directions
-        if random.random() < self.epsilon:
-            return random.choice(dirs)
-        q_vals = [self.Q.get((state_key, d), 0) for d in dirs]
-        max_q = max(q_vals)
-        best = [d for d, q in zip(dirs, q_vals) if q == max_q]
-        return random.choice(best)
+    def random_direction(self, valid_mask):
+        dirs = self._mask_dirs[valid_mask]
+        return dirs[self.rng.integers(len(dirs))]
 
-    def valid_directions(self, position, grid_size=40):
+    def plan_greedy(self, position, k):
+        # Follow the current greedy policy k steps ahead, assuming moves land as intended
+        moves = []
         x, y = position
-        m = grid_size - 1
-        dirs = []
-        if x > 0: dirs.append("N")
-        if x < m: dirs.append("S")
-        if y > 0: dirs.append("W")
-        if y < m: dirs.append("E")
-        return dirs or self.directions
+        for _ in range(k):
+            move = self.greedy_direction((x, y), self.valid_directions((x, y)))
+            moves.append(move)
+            dx, dy = self.DIR_DELTA[move]
+            x, y = x + dx, y + dy
+        return moves
+
+    def valid_directions(self, position):
+        x, y = position
+        self._check_cell(x, y)
+        return self._valid_mask[x, y]
 
     def learn(self, state_key, action, reward, next_key, done):
-        q_val = self.Q.get((state_key, action), 0)
-        if done:
-            target = reward
-        else:
-            future_max = max(self.Q.get((next_key, d), 0) for d in self.directions)
-            target = reward + self.gamma * future_max
-        self.Q[(state_key, action)] = q_val + self.alpha * (target - q_val)
-
-    def train(self):
-        best_reward = float('-inf')
-        for _ in range(self.episodes):
-            self.client.enter_world(self.world_id)
-            loc = self.client.get_location()
-            position = loc.get("position", [])
-            state_key = self._state_key((loc.get("worldId"), tuple(position)))
-            done = False
-            total = 0
-            while not done:
-                valid = self.valid_directions(position)
-                move = self.choose_direction(state_key, valid)
-                res = self.client.make_move(self.world_id, move)
+        x, y = state_key >> 8, state_key & 0xFF
+        # next_key is None on terminal steps without a position; q_update ignores (nx, ny) when done
+        nx, ny = (0, 0) if done else (next_key >> 8, next_key & 0xFF)
+        self._check_cell(x, y)
+        self._check_cell(nx, ny)
+        q_update(self.Q, x, y, self.DIR_IDX[action], float(reward),
+                 nx, ny, bool(done), self.alpha, self.gamma)
+
+    async def _rollout(self, queue):
+        # Producer: interacts with the server and hands transitions to _learner
+        # Use the start position from the enter response; only ask for it when it is missing
+        position = (await self.client.enter_world(self.world_id)).get("position")
+        if position is None:
+            position = (await self.client.get_location()).get("position", [])
+        state_key = self._state_key(position)
+        done = False
+        total = 0
+        while not done:
+            moves = self.choose_moves(position, self.valid_directions(position))
+            if len(moves) == 1:
+                results = [await self.client.make_move(self.world_id, moves[0])]
+            else:
+                results = (await self.client.make_moves(self.world_id, moves)).get("results", [])
+                if not results:
+                    raise RuntimeError("move_batch response contained no results")
+            for move, res in zip(moves, results):
                 reward = res.get("reward", 0)
                 done = res.get("completed", False)
-                position = res.get("position", [])
-                next_key = self._state_key((res.get("worldId"), tuple(position)))
-                self.learn(state_key, move, reward, next_key, done)
+                position = res.get("position")
+                if position is not None:
+                    next_key = self._state_key(position)
+                elif done:
+                    # Terminal responses may carry no position; learn() ignores next_key when done
+                    next_key = None
+                else:
+                    raise RuntimeError(f"move response for non-terminal step has no position: {res}")
+                await queue.put((state_key, move, reward, next_key, done))
                 state_key = next_key
                 total += reward
+                if done:
+                    break
+        await queue.put(None)
+        return total
+
+    async def _learner(self, queue):
+        # Consumer: applies Q updates while the next move request is in flight
+        while True:
+            transition = await queue.get()
+            if transition is None:
+                return
+            self.learn(*transition)
+
+    async def run_episode(self):
+        queue = asyncio.Queue(maxsize=64)
+        producer = asyncio.create_task(self._rollout(queue))
+        consumer = asyncio.create_task(self._learner(queue))
+        try:
+            total, _ = await asyncio.gather(producer, consumer)
+        except BaseException:
+            # A failed move must not leave the learner waiting on the queue forever
+            producer.cancel()
+            consumer.cancel()
+            raise
+        return total
+
+    async def _worker(self, episodes, semaphore):
+        best_reward = float('-inf')
+        for _ in range(episodes):
+            async with semaphore:
+                total = await self.run_episode()
             best_reward = max(best_reward, total)
             self.epsilon = max(self.min_epsilon, self.epsilon * self.decay_rate)
-        self.client.store_points(self.world_id, best_reward)
+        return best_reward
+
+    async def train(self):
+        semaphore = asyncio.Semaphore(self.max_concurrent_episodes)
+        n = max(1, min(self.workers, self.episodes))
+        counts = [self.episodes // n + (i < self.episodes % n) for i in range(n)]
+        results = await asyncio.gather(*(self._worker(c, semaphore) for c in counts))
+        best_reward = max(results)
+        # With no episodes best_reward stays -inf; orjson writes that as null, which would
+        # break team["total"] += ... in store_points on the next run
+        if self.episodes > 0:
+            self.client.store_points(self.world_id, best_reward)
         return best_reward
 
 # ——— Main ——————————————————————————————————————————————
-def main():
+async def main():
     client = APIClient()
-    world_id = input("Enter world ID: ").strip()
-    status = client.get_all_status(world_id)
-    print(json.dumps(status, indent=2))
-
-    agent = QLearningAgent(client, status.get("location", {}).get("worldId"))
-    best = agent.train()
-    print(f"Best total reward: {best}")
-
-    print("Final score:", client.get_score())
+    try:
+        world_id = input("Enter world ID: ").strip()
+        status = await client.get_all_status(world_id)
+        print(json.dumps(status, indent=2))
+
+        agent = QLearningAgent(client, status.get("location", {}).get("worldId"))
+        best = await agent.train()
+        print(f"Best total reward: {best}")
+
+        print("Final score:", await client.get_score())
+    finally:
+        # Flush here so write errors surface; the atexit hook is only a safety net
+        try:
+            client.flush()
+        finally:
+            await client.close()
 
 if __name__ == "__main__":
-    main()
-
-
-    agent = QLearningAgent(client, status.get("location", {}).get("worldId"))
-    best = agent.train()
-    print(f"Best total reward: {best}")
-
-    print("Final score:", client.get_score())
-
-# Call main directly
-main()
+    asyncio.run(main())